@@ -0,0 +1,104 @@
+"""
+Static asset pipeline for Mall Application
+
+Minifies the stylesheets in static/, writes them under content-hashed
+filenames together with precompressed .gz (and .br when the brotli package
+is installed) variants, and records the mapping in a manifest that the
+asset_url() template helper reads.
+Usage: python3 assets.py  (or: flask --app mall build-assets)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Files picked up from the static folder, and how each kind is minified
+ASSET_EXTENSIONS = ('.css',)
+
+_CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+def _minify_css_segment(segment):
+    segment = re.sub(r'\s+', ' ', segment)
+    segment = re.sub(r'\s*([{};,>])\s*', r'\1', segment)
+    # Only the space after ':' can go; before it may be a descendant selector
+    segment = re.sub(r':\s+', ':', segment)
+    return segment.replace(';}', '}')
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    source = _CSS_COMMENT.sub('', source)
+    # Odd-numbered parts are string literals and are kept verbatim
+    parts = _CSS_STRING.split(source)
+    for i in range(0, len(parts), 2):
+        parts[i] = _minify_css_segment(parts[i])
+    return ''.join(parts).strip()
+
+
+def hashed_name(filename, content):
+    """style.css -> style.<hash>.css"""
+    root, ext = os.path.splitext(filename)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f'{root}.{digest}{ext}'
+
+
+def _write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def build_assets(static_dir, output_dir):
+    """Build every asset in static_dir into output_dir
+
+    Returns the manifest, mapping each source filename to its hashed name.
+    Previously built files are left in place so that pages rendered before
+    a deploy can still load the assets they reference.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {}
+
+    for filename in sorted(os.listdir(static_dir)):
+        if not filename.endswith(ASSET_EXTENSIONS):
+            continue
+        with open(os.path.join(static_dir, filename), encoding='utf-8') as f:
+            content = minify_css(f.read()).encode('utf-8')
+
+        name = hashed_name(filename, content)
+        path = os.path.join(output_dir, name)
+        _write(path, content)
+        # mtime=0 keeps the .gz byte-identical across builds
+        _write(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(content, mode=brotli.MODE_TEXT))
+        manifest[filename] = name
+
+    _write(os.path.join(output_dir, MANIFEST_NAME),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(output_dir):
+    """Return the manifest written by build_assets, or {} if there is none"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    static = os.path.join(here, 'static')
+    for source, built in build_assets(static, os.path.join(static, 'dist')).items():
+        print(f'{source} -> dist/{built}')
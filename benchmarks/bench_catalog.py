@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: in-memory catalog vs SQLite listing queries
+
+Uses a generated database with N products (see datagen.py) and reports
+the memory held per product by the Catalog and the latency of typical
+home page queries on both paths.
+Usage: python3 benchmarks/bench_catalog.py [N ...]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datagen
+import mall
+from catalog import Catalog
+
+QUERIES = [
+    ('all', '', None),
+    ('Electronics', '', None),
+    ('all', 'smart', None),
+    ('all', '', 'price_asc'),
+    ('Home', '', 'price_desc'),
+]
+
+
+def open_database(count):
+    """Connect to a cached generated database with count products"""
+    mall.DATABASE = datagen.cached_database(products=count, orders=0)
+    return mall.get_db()
+
+
+def timed(func, repeat):
+    """Return the mean seconds per call of func"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(count):
+    conn = open_database(count)
+    try:
+        tracemalloc.start()
+        catalog = Catalog(mall.DATABASE)
+        catalog.load(conn)
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"\n{len(catalog)} products, {held / len(catalog):.0f} bytes/product in memory")
+        print(f"{'query':<32}{'sqlite ms':>12}{'memory ms':>12}")
+        repeat = max(5, 20000 // len(catalog))
+        for category, search, sort in QUERIES:
+            sqlite_time = timed(
+                lambda: mall.query_products(conn.cursor(), category, search, sort), repeat)
+            memory_time = timed(
+                lambda: catalog.query(None if category == 'all' else category, search, sort,
+                                      limit=None), repeat)
+            label = f'{category}/{search or "-"}/{sort or "id"}'
+            print(f"{label:<32}{sqlite_time * 1000:>12.3f}{memory_time * 1000:>12.3f}")
+
+        page_time = timed(lambda: catalog.query(sort='price_asc', offset=40, limit=20), repeat)
+        print(f"{'all/-/price_asc page 3 of 20':<32}{'':>12}{page_time * 1000:>12.3f}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    for count in [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]:
+        run(count)
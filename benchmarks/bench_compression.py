@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: home page compression at several catalog sizes
+
+For each catalog size (a generated database, see datagen.py), renders
+the home page with and without Accept-Encoding and reports the bytes
+saved and the CPU time per request spent rendering the page, gzipping
+it, and serving it from the middleware's compressed body cache.
+Usage: python3 benchmarks/bench_compression.py [N ...]
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datagen
+import mall
+from compression import CompressionMiddleware
+
+
+def cpu_per_call(func, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) / repeat
+
+
+def run(count, levels):
+    mall.DATABASE = datagen.cached_database(products=count, orders=0)
+    client = mall.app.test_client()
+    repeat = max(5, 5000 // count)
+    render = cpu_per_call(lambda: client.get('/').get_data(), repeat)
+    plain = client.get('/').get_data()
+
+    # Compressed bytes match what the middleware sends for this page
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    for level in levels:
+        uncached = CompressionMiddleware(None, level=level, cache_size=0)
+        cached = CompressionMiddleware(None, level=level)
+        compressed = uncached.compress(plain, 'gzip')
+        cached.compress(plain, 'gzip')
+        gzip_time = cpu_per_call(lambda: uncached.compress(plain, 'gzip'), repeat)
+        hit_time = cpu_per_call(lambda: cached.compress(plain, 'gzip'), repeat)
+
+        saved = 1 - len(compressed) / len(plain)
+        print(f"{count:>8}{level:>7}{len(plain) / 1024:>11.1f}{len(compressed) / 1024:>11.1f}"
+              f"{saved:>8.0%}{render * 1000:>11.2f}{gzip_time * 1000:>11.2f}"
+              f"{hit_time * 1000:>11.3f}")
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [15, 100, 1000, 5000]
+    print(f"{'products':>8}{'level':>7}{'raw KB':>11}{'gzip KB':>11}{'saved':>8}"
+          f"{'render ms':>11}{'+gzip ms':>11}{'+cached ms':>11}")
+    for count in counts:
+        run(count, (1, 6, 9))
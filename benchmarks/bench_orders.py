@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: order history pages for a session
+
+The history lists the orders placed in a session, at most
+ORDER_HISTORY_SESSION_LIMIT of them. On generated databases (see
+datagen.py) of several sizes, compares the keyset, single-query page
+fetch against OFFSET pagination with one order_items lookup per order,
+for a full session on its first and last page.
+Usage: python3 benchmarks/bench_orders.py [orders ...]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datagen
+import mall
+
+PAGE_SIZE = mall.app.config['ORDER_HISTORY_PAGE_SIZE']
+SESSION_SIZE = mall.app.config['ORDER_HISTORY_SESSION_LIMIT']
+
+
+def open_database(count):
+    """Connect to a cached generated database with count orders"""
+    mall.DATABASE = datagen.cached_database(orders=count)
+    return mall.get_db()
+
+
+def offset_page(cursor, order_ids, page):
+    """The naive path: OFFSET pagination and a lookup per order"""
+    cursor.execute(f'''
+        SELECT * FROM orders WHERE id IN ({', '.join('?' * len(order_ids))})
+        ORDER BY order_date DESC, id DESC LIMIT ? OFFSET ?
+    ''', (*order_ids, PAGE_SIZE, page * PAGE_SIZE))
+    orders = cursor.fetchall()
+    for order in orders:
+        cursor.execute('SELECT * FROM order_items WHERE order_id = ?', (order['id'],))
+        cursor.fetchall()
+    return orders
+
+
+def keyset_cursor(cursor, order_ids, page):
+    """Follow the history from the first page to the given one"""
+    before = None
+    for _ in range(page):
+        _, before = mall.fetch_order_history(cursor, order_ids, before, PAGE_SIZE)
+    return before
+
+
+def timed(func, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(count):
+    conn = open_database(count)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM orders')
+    order_ids = random.Random(42).sample([row[0] for row in cursor.fetchall()], SESSION_SIZE)
+    last_page = (SESSION_SIZE - 1) // PAGE_SIZE
+
+    print(f"\n{count} orders, session with {SESSION_SIZE} of them")
+    print(f"{'page':<10}{'offset + N+1 ms':>18}{'keyset joined ms':>18}")
+    for page in (0, last_page):
+        before = keyset_cursor(cursor, order_ids, page)
+        naive = timed(lambda: offset_page(cursor, order_ids, page))
+        keyset = timed(lambda: mall.fetch_order_history(cursor, order_ids, before, PAGE_SIZE))
+        print(f"{page:<10}{naive * 1000:>18.3f}{keyset * 1000:>18.3f}")
+    conn.close()
+
+
+def main(counts):
+    for count in counts:
+        run(count)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time to first response
+
+Starts a fresh interpreter per run, so imports, schema setup and template
+compilation are all paid again, and measures how long it takes until the
+home page has been served once.
+- first deploy: no database and no template cache on disk
+- restart: database and template cache left by the previous run
+- no warm-up: restart without startup(), templates compiled on first hit
+Usage: python3 benchmarks/bench_startup.py [runs]
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Runs in the child interpreter
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import mall
+mall.DATABASE = {database!r}
+mall.app.config['TEMPLATE_CACHE_DIR'] = {cache_dir!r}
+imported = time.perf_counter()
+timings = mall.startup() if {warm} else {{}}
+ready = time.perf_counter()
+client = mall.app.test_client()
+assert client.get('/').status_code == 200
+first = time.perf_counter()
+client.get('/')
+second = time.perf_counter()
+print(json.dumps({{
+    'import': imported - start,
+    'startup': ready - imported,
+    'first_request': first - ready,
+    'second_request': second - first,
+    'ttfr': first - start,
+    **{{'startup.' + k: v for k, v in timings.items()}},
+}}))
+'''
+
+
+def measure(database, cache_dir, warm=True):
+    code = CHILD.format(root=ROOT, database=database, cache_dir=cache_dir, warm=warm)
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def report(label, results):
+    print(f"\n{label}")
+    for key in results[0]:
+        values = sorted(result[key] for result in results)
+        print(f"  {key:<22}{values[len(values) // 2] * 1000:>10.2f} ms (median)")
+
+
+def main(runs):
+    work_dir = tempfile.mkdtemp()
+    database = os.path.join(work_dir, 'mall.db')
+    cache_dir = os.path.join(work_dir, 'jinja_cache')
+    try:
+        first_deploy = []
+        for _ in range(runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            if os.path.exists(database):
+                os.unlink(database)
+            first_deploy.append(measure(database, cache_dir))
+        report('first deploy', first_deploy)
+
+        report('restart', [measure(database, cache_dir) for _ in range(runs)])
+        report('no warm-up', [measure(database, cache_dir, warm=False)
+                              for _ in range(runs)])
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,219 @@
+"""
+In-memory catalog engine for Mall Application
+
+Keeps a columnar copy of the products table so that the home page listing
+can filter, sort and page without going through SQLite or building a
+sqlite3.Row per product. The copy is refreshed incrementally from the
+product_changes log that init_db() maintains through triggers.
+"""
+
+import bisect
+import sys
+import threading
+from array import array
+
+
+class ProductView:
+    """Read-only copy of one catalog row, used by the templates
+
+    The values are copied out under the catalog lock, so a view stays
+    consistent however long the template takes to render it.
+    """
+
+    __slots__ = ('id', 'name', 'category', 'price', 'description', 'image_url', 'stock')
+
+    def __init__(self, catalog, pos):
+        self.id = catalog.ids[pos]
+        self.name = catalog.names[pos]
+        self.category = catalog.categories[catalog.category_codes[pos]]
+        self.price = catalog.prices[pos]
+        self.description = catalog.descriptions[pos]
+        self.image_url = catalog.image_urls[pos]
+        self.stock = catalog.stock[pos]
+
+    def __getitem__(self, key):
+        # Same access style as sqlite3.Row
+        return getattr(self, key)
+
+
+class Catalog:
+    """Columnar, in-memory copy of the products table"""
+
+    def __init__(self, database):
+        self.database = database
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.last_seq = 0
+
+        # One slot per product, addressed by row position
+        self.ids = array('q')
+        self.prices = array('d')
+        self.stock = array('q')
+        self.category_codes = array('l')
+        self.live = bytearray()
+        self.names = []
+        self.descriptions = []
+        self.image_urls = []
+        self._search_names = []
+
+        # Category code <-> name, and per-category row positions
+        self.categories = []
+        self._category_codes = {}
+        self.by_category = {}
+
+        self._positions = {}
+        self._dropped = 0
+        self._price_order = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _category_code(self, name):
+        code = self._category_codes.get(name)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(sys.intern(name))
+            self._category_codes[name] = code
+            self.by_category[code] = array('q')
+        return code
+
+    def _store(self, row):
+        """Insert or overwrite the slot for one products row"""
+        code = self._category_code(row['category'])
+        name = sys.intern(row['name'])
+        pos = self._positions.get(row['id'])
+
+        if pos is None:
+            pos = len(self.ids)
+            self._positions[row['id']] = pos
+            self.ids.append(row['id'])
+            self.prices.append(row['price'])
+            self.stock.append(row['stock'])
+            self.category_codes.append(code)
+            self.live.append(1)
+            self.names.append(name)
+            self.descriptions.append(row['description'])
+            self.image_urls.append(row['image_url'])
+            self._search_names.append(name.lower())
+            self.by_category[code].append(pos)
+            return
+
+        old_code = self.category_codes[pos]
+        if old_code != code:
+            self.by_category[old_code].remove(pos)
+            # Keep each category's positions in id order
+            bisect.insort(self.by_category[code], pos)
+        self.prices[pos] = row['price']
+        self.stock[pos] = row['stock']
+        self.category_codes[pos] = code
+        self.names[pos] = name
+        self.descriptions[pos] = row['description']
+        self.image_urls[pos] = row['image_url']
+        self._search_names[pos] = name.lower()
+
+    def _drop(self, product_id):
+        """Tombstone the slot of a deleted product"""
+        pos = self._positions.pop(product_id, None)
+        if pos is None:
+            return
+        self.live[pos] = 0
+        self._dropped += 1
+        self.by_category[self.category_codes[pos]].remove(pos)
+        self.names[pos] = self.descriptions[pos] = self.image_urls[pos] = None
+        self._search_names[pos] = None
+
+    def load(self, conn):
+        """Load every product, replacing whatever is held"""
+        with self._lock:
+            self._reset()
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM product_changes')
+            self.last_seq = cursor.fetchone()[0]
+            cursor.execute('SELECT * FROM products ORDER BY id')
+            for row in cursor:
+                self._store(row)
+
+    def refresh(self, conn):
+        """Apply changes logged since the last load or refresh
+
+        Returns the number of products that were reloaded or dropped.
+        """
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT product_id, MAX(seq) AS seq FROM product_changes
+            WHERE seq > ? GROUP BY product_id
+        ''', (self.last_seq,))
+        changed = cursor.fetchall()
+        if not changed:
+            return 0
+
+        with self._lock:
+            for change in changed:
+                cursor.execute('SELECT * FROM products WHERE id = ?',
+                               (change['product_id'],))
+                row = cursor.fetchone()
+                if row:
+                    self._store(row)
+                else:
+                    self._drop(change['product_id'])
+            self.last_seq = max(self.last_seq, max(c['seq'] for c in changed))
+            self._price_order = None
+        return len(changed)
+
+    def category_names(self):
+        """Categories that currently have products, in first-seen order"""
+        return [self.categories[code] for code, positions in self.by_category.items()
+                if positions]
+
+    def get(self, product_id):
+        with self._lock:
+            pos = self._positions.get(product_id)
+            return ProductView(self, pos) if pos is not None else None
+
+    def _ordered_by_price(self):
+        if self._price_order is None:
+            live = [pos for pos in range(len(self.ids)) if self.live[pos]]
+            live.sort(key=self.prices.__getitem__)
+            self._price_order = array('q', live)
+        return self._price_order
+
+    def query(self, category=None, search='', sort=None, offset=0, limit=None):
+        """Return (products, total) for one page of the listing
+
+        sort may be None (product id order), 'price_asc' or 'price_desc'.
+        Only the rows on the requested page are copied into ProductView.
+        """
+        with self._lock:
+            if category is not None:
+                code = self._category_codes.get(category)
+                if code is None:
+                    return [], 0
+
+            if sort in ('price_asc', 'price_desc'):
+                order = self._ordered_by_price()
+                if category is not None:
+                    codes = self.category_codes
+                    order = [pos for pos in order if codes[pos] == code]
+            elif category is not None:
+                order = self.by_category[code]
+            elif self._dropped:
+                live = self.live
+                order = [pos for pos in range(len(self.ids)) if live[pos]]
+            else:
+                order = range(len(self.ids))
+
+            if search:
+                needle = search.lower()
+                names = self._search_names
+                order = [pos for pos in order if needle in names[pos]]
+
+            total = len(order)
+            end = total if limit is None else min(total, offset + limit)
+            if sort == 'price_desc':
+                indices = range(total - 1 - offset, total - 1 - end, -1)
+            else:
+                indices = range(offset, end)
+            page = [ProductView(self, order[i]) for i in indices]
+            return page, total
@@ -0,0 +1,233 @@
+"""
+Response compression middleware for Mall Application
+
+Compresses text responses (the rendered pages, JSON) with gzip or deflate
+according to the request's Accept-Encoding. Responses with a known length
+are compressed in one go, and the result is kept in a small cache keyed on
+the body so identical pages are not compressed twice. Responses without a
+Content-Length (generators) are compressed chunk by chunk as they stream.
+"""
+
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+])
+
+# zlib window bits for each content coding: gzip wrapper, zlib wrapper
+ENCODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick the best of ENCODINGS for an Accept-Encoding header, or None"""
+    accept = parse_accept_header(accept_encoding)
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accept[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """WSGI middleware that gzip/deflate-compresses text responses
+
+    min_size: responses smaller than this many bytes are sent as they are
+    level: zlib compression level, 1 (fastest) to 9 (smallest)
+    cache_size: number of compressed bodies to keep, 0 to disable
+    config: optional mapping (such as app.config) read on every request;
+        its COMPRESS_MIN_SIZE, COMPRESS_LEVEL and COMPRESS_CACHE_SIZE
+        override the arguments above
+    """
+
+    def __init__(self, app, min_size=500, level=6, cache_size=64,
+                 mimetypes=COMPRESSIBLE_MIMETYPES, config=None):
+        self.app = app
+        self.config = config if config is not None else {}
+        self._defaults = {
+            'COMPRESS_MIN_SIZE': min_size,
+            'COMPRESS_LEVEL': level,
+            'COMPRESS_CACHE_SIZE': cache_size,
+        }
+        self.mimetypes = mimetypes
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _setting(self, name):
+        return self.config.get(name, self._defaults[name])
+
+    @property
+    def min_size(self):
+        return self._setting('COMPRESS_MIN_SIZE')
+
+    @property
+    def level(self):
+        return self._setting('COMPRESS_LEVEL')
+
+    @property
+    def cache_size(self):
+        return self._setting('COMPRESS_CACHE_SIZE')
+
+    def __call__(self, environ, start_response):
+        encoding = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+
+        response = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            response.update(status=status, headers=headers, exc_info=exc_info)
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        if response:
+            headers, compress = self._plan(response['status'], response['headers'], encoding)
+            if not compress:
+                # Hand back app_iter itself so the server can still use
+                # wsgi.file_wrapper (sendfile) for files sent as they are
+                write = start_response(response['status'], headers, response['exc_info'])
+                for chunk in written:
+                    write(chunk)
+                return app_iter
+        return self._respond(app_iter, response, written, encoding, start_response)
+
+    def _plan(self, status, headers, encoding):
+        """Headers to send, and whether the body may need compressing"""
+        if not self._compressible(status, Headers(headers)):
+            return headers, False
+        # The representation depends on Accept-Encoding from here on,
+        # whether or not this particular response ends up compressed
+        headers = Headers(headers)
+        headers['Vary'] = ', '.join(_add_vary(headers.get('Vary'), 'Accept-Encoding'))
+        length = headers.get('Content-Length', type=int)
+        if encoding is None or (length is not None and length < self.min_size):
+            return headers.to_wsgi_list(), False
+        return headers.to_wsgi_list(), True
+
+    def _compressible(self, status, headers):
+        code = int(status.split(None, 1)[0])
+        if not 200 <= code < 300 or code in (204, 206):
+            return False
+        if 'Content-Encoding' in headers:
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        mimetype = headers.get('Content-Type', '').split(';')[0].strip().lower()
+        return mimetype in self.mimetypes
+
+    def compress(self, body, encoding):
+        """Compress a whole body, reusing the cached result for identical bodies"""
+        cache_size = self.cache_size
+        if not cache_size:
+            return self._compress(body, encoding)
+
+        key = (encoding, self.level, hashlib.blake2b(body, digest_size=16).digest())
+        with self._cache_lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                return data
+
+        data = self._compress(body, encoding)
+        with self._cache_lock:
+            self._cache[key] = data
+            while len(self._cache) > cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def _compress(self, body, encoding):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, ENCODINGS[encoding])
+        return compressor.compress(body) + compressor.flush()
+
+    def _respond(self, app_iter, response, written, encoding, start_response):
+        try:
+            chunks = iter(app_iter)
+            buffered = written
+
+            # Applications may call start_response as late as their first chunk
+            if not response:
+                for chunk in chunks:
+                    buffered.append(chunk)
+                    if response:
+                        break
+
+            status = response['status']
+            exc_info = response['exc_info']
+            header_list, compress = self._plan(status, response['headers'], encoding)
+            if not compress:
+                start_response(status, header_list, exc_info)
+                yield from buffered
+                yield from chunks
+                return
+
+            headers = Headers(header_list)
+            length = headers.get('Content-Length', type=int)
+            if length is not None:
+                # Whole body is known up front
+                buffered.extend(chunks)
+                data = self.compress(b''.join(buffered), encoding)
+                _set_encoded(headers, encoding)
+                headers['Content-Length'] = str(len(data))
+                start_response(status, headers.to_wsgi_list(), exc_info)
+                yield data
+                return
+
+            # Streaming body: hold chunks back until min_size is reached
+            size = sum(len(chunk) for chunk in buffered)
+            if size < self.min_size:
+                for chunk in chunks:
+                    buffered.append(chunk)
+                    size += len(chunk)
+                    if size >= self.min_size:
+                        break
+                else:
+                    start_response(status, headers.to_wsgi_list(), exc_info)
+                    yield from buffered
+                    return
+
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, ENCODINGS[encoding])
+            _set_encoded(headers, encoding)
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            # Sync-flush each chunk so the client sees it without waiting for the end
+            yield compressor.compress(b''.join(buffered)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+
+def _add_vary(vary, field):
+    values = [value.strip() for value in (vary or '').split(',') if value.strip()]
+    if field.lower() not in (value.lower() for value in values):
+        values.append(field)
+    return values
+
+
+def _set_encoded(headers, encoding):
+    """Adjust headers of a response whose body is being compressed"""
+    headers['Content-Encoding'] = encoding
+    headers.pop('Content-Length', None)
+    # The compressed bytes differ from what a strong ETag promised
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        headers['ETag'] = 'W/' + etag
@@ -0,0 +1,233 @@
+"""
+Synthetic data generator for Mall Application
+
+Builds mall.db-format databases with N products across M categories,
+customers, and orders whose product popularity follows a Zipf
+distribution. The same parameters and seed always give identical data,
+so generated databases can be cached and shared between test and
+benchmark runs (see cached_database()).
+Usage: python3 datagen.py OUTPUT.db [--products N] [--categories M]
+                          [--customers C] [--orders O] [--seed S]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import mall
+
+# Bump whenever the generated data changes for the same parameters
+GENERATOR_VERSION = 2
+
+CATEGORIES = [
+    ('Electronics', '📱', ['Smartphone', 'Laptop', 'Headphones', 'Tablet', 'Speaker', 'Monitor']),
+    ('Fashion', '👗', ['Jacket', 'Sneakers', 'Jeans', 'Dress', 'Scarf', 'Watch']),
+    ('Home', '🏠', ['Lamp', 'Blender', 'Rug', 'Vacuum', 'Kettle', 'Pillow']),
+    ('Gaming', '🎮', ['Controller', 'Keyboard', 'Mouse', 'Headset', 'Chair', 'Console']),
+    ('Books', '📚', ['Novel', 'Cookbook', 'Atlas', 'Biography', 'Journal', 'Guide']),
+    ('Sports', '⚽', ['Ball', 'Racket', 'Yoga Mat', 'Dumbbell', 'Helmet', 'Bottle']),
+    ('Toys', '🧸', ['Puzzle', 'Robot', 'Plush Bear', 'Kite', 'Train Set', 'Blocks']),
+    ('Garden', '🌱', ['Planter', 'Hose', 'Shears', 'Lantern', 'Bench', 'Seed Kit']),
+    ('Beauty', '💄', ['Serum', 'Lipstick', 'Brush Set', 'Perfume', 'Cream', 'Mirror']),
+    ('Kitchen', '🍳', ['Skillet', 'Knife Set', 'Mixer', 'Toaster', 'Pan', 'Grinder']),
+    ('Office', '🖊️', ['Desk', 'Notebook', 'Stapler', 'Pen Set', 'Organizer', 'Desk Lamp']),
+    ('Outdoors', '⛺', ['Tent', 'Backpack', 'Sleeping Bag', 'Compass', 'Stove', 'Cooler']),
+]
+ADJECTIVES = ['Classic', 'Compact', 'Deluxe', 'Ergonomic', 'Lightweight', 'Premium',
+              'Portable', 'Smart', 'Vintage', 'Wireless', 'Rugged', 'Eco']
+BRANDS = ['Acme', 'Northwind', 'Zenith', 'Orbit', 'Summit', 'Nimbus', 'Vertex', 'Harbor']
+MATERIALS = ['recycled aluminium', 'organic cotton', 'stainless steel', 'bamboo',
+             'tempered glass', 'vegan leather', 'oak', 'ceramic']
+FEATURES = ['Built to last for years of daily use', 'Backed by a two-year warranty',
+            'Designed for comfort and easy cleaning', 'Ships in plastic-free packaging',
+            'Rated highly by thousands of customers', 'Perfect as a gift']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie',
+               'Avery', 'Quinn', 'Robin', 'Drew']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Khan', 'Muller',
+              'Rossi', 'Tanaka', 'Dubois', 'Larsen']
+STREETS = ['Main', 'Oak', 'Maple', 'Cedar', 'Park', 'Lake', 'Hill', 'River']
+CITIES = ['Springfield', 'Riverton', 'Lakeside', 'Fairview', 'Georgetown', 'Ashford']
+STATUSES = ['pending', 'shipped', 'delivered', 'cancelled']
+STATUS_WEIGHTS = [10, 20, 65, 5]
+
+# Orders are spread over the year before this date
+ORDER_EPOCH = datetime(2025, 1, 1)
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative weights of ranks 1..count under Zipf's law"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def category_names(count):
+    """count category names, numbering repeats once the base list runs out"""
+    names = []
+    for i in range(count):
+        name = CATEGORIES[i % len(CATEGORIES)][0]
+        names.append(name if i < len(CATEGORIES) else f'{name} {i // len(CATEGORIES) + 1}')
+    return names
+
+
+def _products(rng, count, categories):
+    names = category_names(categories)
+    for product_id in range(1, count + 1):
+        code = rng.randrange(categories)
+        _, icon, nouns = CATEGORIES[code % len(CATEGORIES)]
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(nouns)
+        yield (
+            product_id,
+            f'{rng.choice(BRANDS)} {adjective} {noun}',
+            names[code],
+            round(max(0.99, rng.lognormvariate(3.8, 1.0)), 2),
+            f'{adjective} {noun.lower()} made with {rng.choice(MATERIALS)}. '
+            f'{rng.choice(FEATURES)}.',
+            icon,
+            rng.randint(0, 500),
+        )
+
+
+def _customers(rng, count):
+    customers = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        customers.append((
+            f'{first} {last}',
+            f'{first.lower()}.{last.lower()}{i}@example.com',
+            f'{rng.randint(1, 9999)} {rng.choice(STREETS)} St, {rng.choice(CITIES)}',
+        ))
+    return customers
+
+
+def generate(path, products=1000, categories=8, customers=200, orders=2000,
+             seed=0, zipf_exponent=1.1):
+    """Write a new database at path filled with synthetic data
+
+    Product popularity in orders follows Zipf's law with the given
+    exponent over a seeded random ranking of the products. The
+    product_changes log is left empty.
+    Returns a dict with the number of rows written per table.
+    """
+    if os.path.exists(path) and os.path.getsize(path):
+        raise FileExistsError(f'{path} already contains data')
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+
+    # Bulk load: no journal or fsync (a failed build is simply discarded),
+    # secondary indexes are built once after the rows are in, and the
+    # product change triggers are off so the load writes no change log
+    cursor.execute('PRAGMA journal_mode = OFF')
+    cursor.execute('PRAGMA synchronous = OFF')
+    mall.create_schema(cursor)
+    cursor.execute('''
+        SELECT type, name FROM sqlite_master
+        WHERE type = 'trigger' OR (type = 'index' AND sql IS NOT NULL)
+    ''')
+    for kind, name in cursor.fetchall():
+        cursor.execute(f'DROP {kind.upper()} {name}')
+
+    cursor.execute('BEGIN')
+    product_rows = list(_products(rng, products, categories))
+    cursor.executemany('''
+        INSERT INTO products (id, name, category, price, description, image_url, stock)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', product_rows)
+
+    customer_rows = _customers(rng, customers)
+    ranked = [row[0] for row in product_rows]
+    rng.shuffle(ranked)
+    cum_weights = zipf_cum_weights(len(ranked), zipf_exponent)
+
+    if not customers or not products:
+        orders = 0
+    order_rows = []
+    item_rows = []
+    for order_id in range(1, orders + 1):
+        picked = set(rng.choices(ranked, cum_weights=cum_weights, k=rng.randint(1, 5)))
+        total = 0
+        for product_id in sorted(picked):
+            product = product_rows[product_id - 1]
+            quantity = rng.randint(1, 3)
+            item_rows.append((order_id, product_id, product[1], quantity, product[3]))
+            total += product[3] * quantity
+        order_date = ORDER_EPOCH - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        order_rows.append((order_id, *rng.choice(customer_rows), round(total, 2),
+                           order_date.strftime('%Y-%m-%d %H:%M:%S'),
+                           rng.choices(STATUSES, STATUS_WEIGHTS)[0]))
+
+    cursor.executemany('''
+        INSERT INTO orders (id, customer_name, customer_email, customer_address,
+                            total_amount, order_date, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', order_rows)
+    cursor.executemany('''
+        INSERT INTO order_items (order_id, product_id, product_name, quantity, price)
+        VALUES (?, ?, ?, ?, ?)
+    ''', item_rows)
+
+    # Recreates the indexes and triggers. The change log starts empty:
+    # readers load the products table itself and follow the log from there
+    mall.create_schema(cursor)
+    cursor.execute(f'PRAGMA user_version = {mall.SCHEMA_VERSION}')
+    conn.commit()
+    conn.close()
+    return {'products': len(product_rows), 'orders': len(order_rows),
+            'order_items': len(item_rows)}
+
+
+def default_cache_dir():
+    return os.environ.get('MALL_DATAGEN_CACHE',
+                          os.path.join(tempfile.gettempdir(), 'mall-datagen'))
+
+
+def cached_database(cache_dir=None, **params):
+    """Return the path of a generated database, building it on first use
+
+    params are passed to generate(). The file name encodes the parameters
+    and the schema and generator versions, so a cached database is reused
+    only while it is still what generate() would produce. Treat the file as
+    read-only; copy it before writing to it.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    key = '-'.join(f'{name}{value}' for name, value in sorted(params.items()))
+    path = os.path.join(cache_dir,
+                        f'mall-s{mall.SCHEMA_VERSION}-g{GENERATOR_VERSION}-{key}.db')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, building = tempfile.mkstemp(suffix='.db', dir=cache_dir)
+    os.close(fd)
+    try:
+        generate(building, **params)
+        # Atomic, so concurrent runs never see a half-built database
+        os.replace(building, path)
+    except BaseException:
+        os.unlink(building)
+        raise
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic mall database')
+    parser.add_argument('output', help='path of the database to create')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=8)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--zipf-exponent', type=float, default=1.1)
+    args = parser.parse_args()
+
+    counts = generate(args.output, args.products, args.categories, args.customers,
+                      args.orders, args.seed, args.zipf_exponent)
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
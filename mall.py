@@ -1,24 +1,83 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, jsonify,
+                   send_from_directory, abort)
+from jinja2 import FileSystemBytecodeCache
+import mimetypes
+import secrets
 import sqlite3
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+import assets
+from catalog import Catalog
+from compression import CompressionMiddleware
+
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
+# 'sqlite' queries the database on every listing, 'memory' serves the
+# home page from the in-memory Catalog
+app.config['CATALOG_ENGINE'] = os.environ.get('MALL_CATALOG_ENGINE', 'sqlite')
+
+# Product change feed: longest a /changes long-poll may block, how often
+# it re-checks the log, and how often the log is compacted
+app.config['CHANGES_MAX_WAIT'] = 25
+app.config['CHANGES_POLL_INTERVAL'] = 0.5
+app.config['CHANGES_COMPACT_INTERVAL'] = 3600
+
+# Checkout idempotency keys: how long a key keeps mapping to its order, and
+# how many recent keys are also kept in memory
+app.config['IDEMPOTENCY_TTL'] = 24 * 3600
+app.config['IDEMPOTENCY_CACHE_SIZE'] = 1024
+
+# Orders shown per page of the order history, and how many of the orders
+# placed in a session it remembers (their ids live in the session cookie)
+app.config['ORDER_HISTORY_PAGE_SIZE'] = 20
+app.config['ORDER_HISTORY_SESSION_LIMIT'] = 100
+
+# Compiled templates are kept here so restarted workers skip Jinja compilation
+app.config['TEMPLATE_CACHE_DIR'] = os.path.join(app.root_path, '.jinja_cache')
+
+# Output of the asset pipeline (flask build-assets); fingerprinted files
+# never change, so browsers may cache them for a year without revalidating
+app.config['ASSETS_DIR'] = os.path.join(app.static_folder, 'dist')
+app.config['ASSETS_MAX_AGE'] = 365 * 24 * 3600
+
+# Response compression: bodies below COMPRESS_MIN_SIZE bytes are sent as is,
+# COMPRESS_LEVEL trades CPU for size (1-9). Read on every request, so
+# changes made after import take effect
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('MALL_COMPRESS_MIN_SIZE', 500))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('MALL_COMPRESS_LEVEL', 6))
+app.config['COMPRESS_CACHE_SIZE'] = 64
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, config=app.config)
+
 DATABASE = 'mall.db'
 
+# Bump whenever init_db() changes the schema, so existing databases are upgraded
+SCHEMA_VERSION = 4
+
+PRODUCT_SORTS = {
+    'price_asc': 'price ASC, id',
+    'price_desc': 'price DESC, id DESC',
+}
+
+_catalog = None
+_asset_manifest = (None, None, {})
+
+# (DATABASE, key) -> (order_id, expires_at), most recently used last
+_idempotency_cache = OrderedDict()
+_idempotency_lock = threading.Lock()
+
 def get_db():
     """Create a database connection"""
     conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db():
-    """Initialize the database with sample products"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
+def create_schema(cursor):
+    """Create any missing tables, indexes and triggers"""
     # Create products table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS products (
@@ -59,6 +118,67 @@ def init_db():
         )
     ''')
     
+    # Order history reads orders by id and joins in their items through this
+    # index. Schema 3 also indexed orders by customer_email, which nothing reads
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_orders_customer')
+    
+    # Create idempotency keys table, mapping a checkout submission to its order
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            order_id INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created
+        ON idempotency_keys (created_at)
+    ''')
+    
+    # Create product change log, filled by triggers on every products write
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS products_log_insert AFTER INSERT ON products
+        BEGIN
+            INSERT INTO product_changes (product_id, op) VALUES (NEW.id, 'insert');
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_log_update AFTER UPDATE ON products
+        BEGIN
+            INSERT INTO product_changes (product_id, op) VALUES (NEW.id, 'update');
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_log_delete AFTER DELETE ON products
+        BEGIN
+            INSERT INTO product_changes (product_id, op) VALUES (OLD.id, 'delete');
+        END;
+    ''')
+
+def init_db():
+    """Initialize the database with sample products
+
+    Returns False without touching the database when its schema version
+    is already current.
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute('PRAGMA user_version')
+    if cursor.fetchone()[0] == SCHEMA_VERSION:
+        conn.close()
+        return False
+    
+    create_schema(cursor)
+    
     # Check if products exist, if not add sample data
     cursor.execute('SELECT COUNT(*) as count FROM products')
     if cursor.fetchone()['count'] == 0:
@@ -85,31 +205,254 @@ def init_db():
             VALUES (?, ?, ?, ?, ?, ?)
         ''', sample_products)
     
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+    conn.close()
+    return True
+
+def precompile_templates():
+    """Compile every template through the on-disk bytecode cache"""
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+def startup():
+    """Prepare the app for its first request and report where the time went
+
+    Returns a dict of phase name to seconds.
+    """
+    timings = {}
+    
+    start = time.perf_counter()
+    migrated = init_db()
+    timings['schema'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    template_count = precompile_templates()
+    timings['templates'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    if app.config['CATALOG_ENGINE'] == 'memory':
+        get_catalog()
+    timings['catalog'] = time.perf_counter() - start
+    
+    timings['total'] = sum(timings.values())
+    app.logger.info(
+        'Startup in %.1fms: schema %.1fms (%s), templates %.1fms (%d), catalog %.1fms',
+        timings['total'] * 1000, timings['schema'] * 1000,
+        'migrated' if migrated else 'current', timings['templates'] * 1000,
+        template_count, timings['catalog'] * 1000)
+    return timings
+
+def get_catalog():
+    """Return the in-memory catalog for DATABASE, brought up to date"""
+    global _catalog
+    conn = get_db()
+    if _catalog is None or _catalog.database != DATABASE:
+        catalog = Catalog(DATABASE)
+        catalog.load(conn)
+        _catalog = catalog
+    else:
+        _catalog.refresh(conn)
+    conn.close()
+    return _catalog
+
+def latest_change_seq(cursor):
+    """Return the newest product_changes sequence number, 0 if none"""
+    cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM product_changes')
+    return cursor.fetchone()[0]
+
+def compact_changes(conn):
+    """Drop change log entries superseded by a later one for the same product
+
+    Readers only need the newest entry per product to catch up, so this
+    keeps every `since` cursor valid. Returns the number of rows removed.
+    """
+    cursor = conn.execute('''
+        DELETE FROM product_changes
+        WHERE seq NOT IN (SELECT MAX(seq) FROM product_changes GROUP BY product_id)
+    ''')
     conn.commit()
+    return cursor.rowcount
+
+def start_change_compactor(interval):
+    """Compact the change log every interval seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            conn = get_db()
+            try:
+                removed = compact_changes(conn)
+                app.logger.info('Compacted %d product change entries', removed)
+            except sqlite3.Error:
+                app.logger.exception('Product change compaction failed')
+            finally:
+                conn.close()
+    
+    thread = threading.Thread(target=run, name='change-compactor', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command('compact-changes')
+def compact_changes_command():
+    """Compact the product change log once"""
+    conn = get_db()
+    print(f'Removed {compact_changes(conn)} superseded change entries')
     conn.close()
 
+def fetch_order_history(cursor, order_ids, before=None, limit=20):
+    """Fetch one page of the given orders, newest first, with their items
+
+    order_ids are the orders placed in the session, at most
+    ORDER_HISTORY_SESSION_LIMIT of them, so the page is picked from those
+    rows alone rather than from an index over all orders.
+    before is the (order_date, id) of the last order on the previous page.
+    Returns (orders, next_before) where each order is a dict with an 'items'
+    list, and next_before is None on the last page.
+    """
+    keyset, params = '', list(order_ids)
+    if before is not None:
+        keyset = 'AND (order_date, id) < (?, ?)'
+        params.extend(before)
+    params.append(limit + 1)
+    
+    # One query for the whole page: look the orders up by primary key,
+    # then join in their items
+    cursor.execute(f'''
+        WITH page AS (
+            SELECT id FROM orders
+            WHERE id IN ({', '.join('?' * len(order_ids))}) {keyset}
+            ORDER BY order_date DESC, id DESC
+            LIMIT ?
+        )
+        SELECT o.id, o.customer_name, o.customer_email, o.customer_address,
+               o.total_amount, o.order_date, o.status,
+               i.product_id, i.product_name, i.quantity, i.price
+        FROM page JOIN orders o ON o.id = page.id
+        LEFT JOIN order_items i ON i.order_id = o.id
+        ORDER BY o.order_date DESC, o.id DESC, i.id
+    ''', params)
+    
+    orders = []
+    for row in cursor.fetchall():
+        if not orders or orders[-1]['id'] != row['id']:
+            orders.append({
+                'id': row['id'],
+                'customer_name': row['customer_name'],
+                'customer_email': row['customer_email'],
+                'customer_address': row['customer_address'],
+                'total_amount': row['total_amount'],
+                'order_date': row['order_date'],
+                'status': row['status'],
+                'items': [],
+            })
+        if row['product_id'] is not None:
+            orders[-1]['items'].append({
+                'product_id': row['product_id'],
+                'product_name': row['product_name'],
+                'quantity': row['quantity'],
+                'price': row['price'],
+            })
+    
+    if len(orders) > limit:
+        del orders[limit:]
+        return orders, (orders[-1]['order_date'], orders[-1]['id'])
+    return orders, None
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress the static assets"""
+    manifest = assets.build_assets(app.static_folder, app.config['ASSETS_DIR'])
+    for source, built in manifest.items():
+        print(f'{source} -> {built}')
+
+def get_asset_manifest():
+    """Source name -> built name of the current asset build, reloaded when rebuilt"""
+    global _asset_manifest
+    assets_dir = app.config['ASSETS_DIR']
+    try:
+        mtime = os.stat(os.path.join(assets_dir, assets.MANIFEST_NAME)).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    if _asset_manifest[:2] != (assets_dir, mtime):
+        _asset_manifest = (assets_dir, mtime, assets.load_manifest(assets_dir))
+    return _asset_manifest[2]
+
+@app.template_global()
+def asset_url(filename):
+    """URL of the built, fingerprinted asset, or the plain static file if not built"""
+    built = get_asset_manifest().get(filename)
+    if built:
+        return url_for('asset', filename=built)
+    return url_for('static', filename=filename)
+
+def _cache_idempotency_key(key, order_id, created_at):
+    expires_at = created_at + app.config['IDEMPOTENCY_TTL']
+    with _idempotency_lock:
+        _idempotency_cache[(DATABASE, key)] = (order_id, expires_at)
+        _idempotency_cache.move_to_end((DATABASE, key))
+        while len(_idempotency_cache) > app.config['IDEMPOTENCY_CACHE_SIZE']:
+            _idempotency_cache.popitem(last=False)
+
+def find_idempotent_order(cursor, key):
+    """Return the order already placed with this idempotency key, or None"""
+    now = time.time()
+    with _idempotency_lock:
+        cached = _idempotency_cache.get((DATABASE, key))
+    if cached and cached[1] > now:
+        return cached[0]
+    
+    cursor.execute('SELECT order_id, created_at FROM idempotency_keys WHERE key = ? AND created_at > ?',
+                   (key, now - app.config['IDEMPOTENCY_TTL']))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    _cache_idempotency_key(key, row['order_id'], row['created_at'])
+    return row['order_id']
+
+def query_products(cursor, category='all', search='', sort=None):
+    """Run the home page listing query against SQLite"""
+    order_by = PRODUCT_SORTS.get(sort, 'id')
+    # Search text is matched literally, so % and _ must not act as wildcards
+    pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    if category != 'all':
+        cursor.execute(f"SELECT * FROM products WHERE category = ? AND name LIKE ? ESCAPE '\\' ORDER BY {order_by}",
+                      (category, pattern))
+    else:
+        cursor.execute(f"SELECT * FROM products WHERE name LIKE ? ESCAPE '\\' ORDER BY {order_by}",
+                      (pattern,))
+    return cursor.fetchall()
+
 @app.route('/')
 def index():
     """Home page showing all products"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
     category = request.args.get('category', 'all')
     search = request.args.get('search', '')
-    
-    if category != 'all':
-        cursor.execute('SELECT * FROM products WHERE category = ? AND name LIKE ?', 
-                      (category, f'%{search}%'))
+    sort = request.args.get('sort')
+    if sort not in PRODUCT_SORTS:
+        sort = None
+    
+    if app.config['CATALOG_ENGINE'] == 'memory':
+        catalog = get_catalog()
+        products, _ = catalog.query(category=None if category == 'all' else category,
+                                    search=search, sort=sort)
+        categories = catalog.category_names()
+        change_seq = catalog.last_seq
     else:
-        cursor.execute('SELECT * FROM products WHERE name LIKE ?', (f'%{search}%',))
-    
-    products = cursor.fetchall()
-    
-    # Get all categories
-    cursor.execute('SELECT DISTINCT category FROM products')
-    categories = [row['category'] for row in cursor.fetchall()]
-    
-    conn.close()
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        products = query_products(cursor, category, search, sort)
+        
+        # Get all categories
+        cursor.execute('SELECT DISTINCT category FROM products')
+        categories = [row['category'] for row in cursor.fetchall()]
+        
+        change_seq = latest_change_seq(cursor)
+        conn.close()
     
     # Initialize cart if not exists
     if 'cart' not in session:
@@ -119,7 +462,55 @@ def index():
                          products=products, 
                          categories=categories,
                          current_category=category,
-                         search_query=search)
+                         current_sort=sort,
+                         search_query=search,
+                         change_seq=change_seq)
+
+@app.route('/changes')
+def changes_feed():
+    """Long-poll for product price and stock changes after ?since=<seq>"""
+    since = request.args.get('since', type=int)
+    max_wait = app.config['CHANGES_MAX_WAIT']
+    wait = min(max(request.args.get('wait', max_wait, type=float), 0), max_wait)
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    seq = latest_change_seq(cursor)
+    
+    # Without a cursor, or with one from a different log, hand out the
+    # current position; a reset tells the client to reload in full
+    if since is None or since > seq:
+        conn.close()
+        response = jsonify(seq=seq, changes=[], reset=since is not None)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    # Wait for something newer than since
+    deadline = time.monotonic() + wait
+    while seq == since and time.monotonic() < deadline:
+        time.sleep(app.config['CHANGES_POLL_INTERVAL'])
+        seq = latest_change_seq(cursor)
+    
+    # Latest state of each product changed after since
+    cursor.execute('''
+        SELECT c.product_id, MAX(c.seq) AS seq, p.id IS NULL AS deleted, p.price, p.stock
+        FROM product_changes c LEFT JOIN products p ON p.id = c.product_id
+        WHERE c.seq > ? AND c.seq <= ?
+        GROUP BY c.product_id
+        ORDER BY seq
+    ''', (since, seq))
+    changes = [{
+        'id': row['product_id'],
+        'seq': row['seq'],
+        'deleted': bool(row['deleted']),
+        'price': row['price'],
+        'stock': row['stock'],
+    } for row in cursor.fetchall()]
+    conn.close()
+    
+    response = jsonify(seq=seq, changes=changes, reset=False)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
@@ -214,6 +605,20 @@ def remove_from_cart(product_id):
 @app.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     """Checkout process"""
+    # A double-clicked or replayed submission gets the order it already
+    # placed, before the (by then emptied) cart is even looked at
+    idempotency_key = None
+    if request.method == 'POST':
+        idempotency_key = request.form.get('idempotency_key')
+        if idempotency_key and len(idempotency_key) <= 64:
+            conn = get_db()
+            order_id = find_idempotent_order(conn.cursor(), idempotency_key)
+            conn.close()
+            if order_id is not None:
+                return order_placed(order_id)
+        else:
+            idempotency_key = None
+    
     if 'cart' not in session or not session['cart']:
         flash('Your cart is empty!', 'error')
         return redirect(url_for('index'))
@@ -231,6 +636,16 @@ def checkout():
         conn = get_db()
         cursor = conn.cursor()
         
+        # Take the write lock up front so that a concurrent duplicate
+        # waits here and then finds the key recorded below
+        cursor.execute('BEGIN IMMEDIATE')
+        if idempotency_key:
+            order_id = find_idempotent_order(cursor, idempotency_key)
+            if order_id is not None:
+                conn.rollback()
+                conn.close()
+                return order_placed(order_id)
+        
         # Calculate total
         total = 0
         for product_id, quantity in session['cart'].items():
@@ -262,14 +677,21 @@ def checkout():
                     UPDATE products SET stock = stock - ? WHERE id = ?
                 ''', (quantity, int(product_id)))
         
+        # Record the submission, dropping keys past their TTL
+        if idempotency_key:
+            now = time.time()
+            cursor.execute('DELETE FROM idempotency_keys WHERE created_at <= ?',
+                           (now - app.config['IDEMPOTENCY_TTL'],))
+            cursor.execute('INSERT INTO idempotency_keys (key, order_id, created_at) VALUES (?, ?, ?)',
+                           (idempotency_key, order_id, now))
+        
         conn.commit()
         conn.close()
         
-        # Clear cart
-        session['cart'] = {}
+        if idempotency_key:
+            _cache_idempotency_key(idempotency_key, order_id, now)
         
-        flash(f'Order #{order_id} placed successfully! Thank you for your purchase!', 'success')
-        return redirect(url_for('order_confirmation', order_id=order_id))
+        return order_placed(order_id)
     
     # GET request - show checkout form
     conn = get_db()
@@ -292,7 +714,20 @@ def checkout():
     
     conn.close()
     
-    return render_template('checkout.html', cart_items=cart_items, total=total)
+    return render_template('checkout.html', cart_items=cart_items, total=total,
+                         idempotency_key=secrets.token_urlsafe(24))
+
+def order_placed(order_id):
+    """Clear the cart and send the customer to their order confirmation"""
+    # Clear cart and remember the order for this session's order history.
+    # The checkout email is not verified, so history is never looked up by it
+    session['cart'] = {}
+    order_ids = [i for i in session.get('order_ids', []) if i != order_id]
+    order_ids.append(order_id)
+    session['order_ids'] = order_ids[-app.config['ORDER_HISTORY_SESSION_LIMIT']:]
+    
+    flash(f'Order #{order_id} placed successfully! Thank you for your purchase!', 'success')
+    return redirect(url_for('order_confirmation', order_id=order_id))
 
 @app.route('/order/<int:order_id>')
 def order_confirmation(order_id):
@@ -316,6 +751,63 @@ def order_confirmation(order_id):
     
     return render_template('order_confirmation.html', order=order, order_items=order_items)
 
+@app.route('/orders')
+def order_history():
+    """Order history of the orders placed in this session"""
+    order_ids = session.get('order_ids')
+    if not order_ids:
+        flash('No orders yet!', 'error')
+        return redirect(url_for('index'))
+    
+    # ?before=<order_date>|<id> continues after the previous page
+    before = None
+    if request.args.get('before'):
+        order_date, _, order_id = request.args['before'].rpartition('|')
+        if not order_id.isdigit():
+            return redirect(url_for('order_history'))
+        before = (order_date, int(order_id))
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    orders, next_before = fetch_order_history(cursor, order_ids, before,
+                                              app.config['ORDER_HISTORY_PAGE_SIZE'])
+    conn.close()
+    
+    next_url = None
+    if next_before:
+        next_url = url_for('order_history', before=f'{next_before[0]}|{next_before[1]}')
+    
+    return render_template('orders.html', orders=orders, next_url=next_url)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a built asset, precompressed when the client accepts it"""
+    # Only fingerprinted files may be cached forever: not the manifest, which
+    # changes with every build, nor the .gz/.br variants, which are reached
+    # through Accept-Encoding and would be mislabelled under their own URL
+    if filename not in set(get_asset_manifest().values()):
+        abort(404)
+    assets_dir = app.config['ASSETS_DIR']
+    encodings = [('br', '.br'), ('gzip', '.gz')]
+    encoding, suffix = None, ''
+    for name, extension in encodings:
+        if (request.accept_encodings[name]
+                and os.path.isfile(os.path.join(assets_dir, filename + extension))):
+            encoding, suffix = name, extension
+            break
+    
+    # send_file hands the open file to the server's wsgi.file_wrapper, which
+    # sends it with sendfile() where supported
+    response = send_from_directory(assets_dir, filename + suffix,
+                                   mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=app.config['ASSETS_MAX_AGE'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/clear_cart')
 def clear_cart():
     """Clear shopping cart"""
@@ -324,6 +816,8 @@ def clear_cart():
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
-    init_db()
+    app.logger.setLevel('INFO')
+    startup()
+    start_change_compactor(app.config['CHANGES_COMPACT_INTERVAL'])
     app.run(debug=True, port=5000)
 
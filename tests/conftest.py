@@ -0,0 +1,31 @@
+"""
+pytest fixtures for Mall Application
+
+scale_database is the path of a cached generated database, shared by the
+whole session and not to be written to. mall_scale_db points the app at a
+private, writable copy of it for one test.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datagen
+import mall
+from tests.scale import DEFAULT_SCALE, copy_scale_database
+
+
+@pytest.fixture(scope='session')
+def scale_database():
+    return datagen.cached_database(**DEFAULT_SCALE)
+
+
+@pytest.fixture
+def mall_scale_db(tmp_path, scale_database, monkeypatch):
+    path = copy_scale_database(str(tmp_path), **DEFAULT_SCALE)
+    monkeypatch.setattr(mall, 'DATABASE', path)
+    return path
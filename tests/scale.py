@@ -0,0 +1,66 @@
+"""
+Scale database fixtures for tests and benchmarks
+
+ScaleTestCase gives each test a private copy of a generated database
+(see datagen.cached_database), built once per parameter set and cached on
+disk across runs. Subclasses set SCALE to the generate() parameters.
+The matching pytest fixtures live in conftest.py.
+"""
+
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datagen
+import mall
+from mall import app
+
+# Small enough to build in about a second, large enough to page and skew
+DEFAULT_SCALE = {
+    'products': 2000,
+    'categories': 10,
+    'customers': 300,
+    'orders': 5000,
+    'seed': 1,
+}
+
+
+def copy_scale_database(dest_dir, **params):
+    """Copy the cached database for params into dest_dir and return its path"""
+    path = os.path.join(dest_dir, 'mall.db')
+    shutil.copyfile(datagen.cached_database(**params), path)
+    return path
+
+
+class ScaleTestCase(unittest.TestCase):
+    """Base class for tests that run against a generated database"""
+
+    SCALE = DEFAULT_SCALE
+
+    @classmethod
+    def setUpClass(cls):
+        """Build the cached database once for the whole class"""
+        super().setUpClass()
+        cls.scale_source = datagen.cached_database(**cls.SCALE)
+
+    def setUp(self):
+        """Point the app at a private copy of the scale database"""
+        self.scale_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.scale_dir, 'mall.db')
+        shutil.copyfile(self.scale_source, self.db_path)
+
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test-secret-key'
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Restore the app database and remove the copy"""
+        mall.DATABASE = self.original_database
+        shutil.rmtree(self.scale_dir)
@@ -0,0 +1,161 @@
+"""
+Tests for the static asset pipeline
+
+This module covers:
+- CSS minification
+- Fingerprinted, precompressed build output and manifest
+- The asset_url() template helper
+- Serving built assets by Accept-Encoding with long-lived caching
+"""
+
+import unittest
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wsgi import FileWrapper
+
+import assets
+import mall
+from mall import app
+
+
+class MinifyCSSTestCase(unittest.TestCase):
+    """Test cases for minify_css"""
+
+    def test_strips_comments_and_whitespace(self):
+        """Test that comments, indentation and trailing semicolons go"""
+        source = '/* Header */\n.navbar {\n    color: red;\n    margin: 0 auto;\n}\n'
+        self.assertEqual(assets.minify_css(source), '.navbar{color:red;margin:0 auto}')
+
+    def test_keeps_strings_and_selectors(self):
+        """Test that string literals and descendant pseudo-classes survive"""
+        source = "body {\n  font-family: 'Segoe  UI', Arial;\n}\ndiv :first-child { top: calc(1px + 2px); }"
+        self.assertEqual(assets.minify_css(source),
+                         "body{font-family:'Segoe  UI',Arial}div :first-child{top:calc(1px + 2px)}")
+
+    def test_media_query(self):
+        """Test that media queries stay valid"""
+        source = '@media (max-width: 768px) {\n    .a {\n        display: none;\n    }\n}'
+        self.assertEqual(assets.minify_css(source), '@media (max-width:768px){.a{display:none}}')
+
+
+class AssetPipelineTestCase(unittest.TestCase):
+    """Test cases for building and serving assets"""
+
+    def setUp(self):
+        """Build the real static folder into a temporary directory"""
+        self.assets_dir = tempfile.mkdtemp()
+        self.original_assets_dir = app.config['ASSETS_DIR']
+        app.config['ASSETS_DIR'] = self.assets_dir
+        app.config['TESTING'] = True
+
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        mall.init_db()
+
+        self.manifest = assets.build_assets(app.static_folder, self.assets_dir)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Clean up"""
+        app.config['ASSETS_DIR'] = self.original_assets_dir
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        shutil.rmtree(self.assets_dir)
+
+    def test_build_output(self):
+        """Test hashed filename, gzip variant and manifest"""
+        built = self.manifest['style.css']
+        self.assertRegex(built, r'^style\.[0-9a-f]{12}\.css$')
+        self.assertEqual(assets.load_manifest(self.assets_dir), self.manifest)
+
+        with open(os.path.join(self.assets_dir, built), 'rb') as f:
+            content = f.read()
+        with open(os.path.join(app.static_folder, 'style.css'), 'rb') as f:
+            self.assertLess(len(content), len(f.read()))
+        with open(os.path.join(self.assets_dir, built + '.gz'), 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), content)
+        self.assertEqual(os.path.exists(os.path.join(self.assets_dir, built + '.br')),
+                         assets.brotli is not None)
+
+    def test_build_is_reproducible(self):
+        """Test that rebuilding unchanged sources gives identical files"""
+        built = self.manifest['style.css']
+        with open(os.path.join(self.assets_dir, built + '.gz'), 'rb') as f:
+            first = f.read()
+        self.assertEqual(assets.build_assets(app.static_folder, self.assets_dir), self.manifest)
+        with open(os.path.join(self.assets_dir, built + '.gz'), 'rb') as f:
+            self.assertEqual(f.read(), first)
+
+    def test_page_links_fingerprinted_asset(self):
+        """Test that base.html links the built stylesheet"""
+        response = self.client.get('/')
+        self.assertIn(f'/assets/{self.manifest["style.css"]}'.encode(), response.data)
+
+    def test_page_falls_back_to_static(self):
+        """Test that pages link the plain file when nothing is built"""
+        app.config['ASSETS_DIR'] = os.path.join(self.assets_dir, 'missing')
+        response = self.client.get('/')
+        self.assertIn(b'/static/style.css', response.data)
+
+    def test_serve_gzip(self):
+        """Test that gzip-capable clients get the precompressed variant"""
+        url = f'/assets/{self.manifest["style.css"]}'
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertTrue(gzip.decompress(response.get_data()).startswith(b'*{margin:0;'))
+        response.close()
+
+    def test_serve_identity(self):
+        """Test that clients without gzip get the plain file"""
+        url = f'/assets/{self.manifest["style.css"]}'
+        response = self.client.get(url, headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertTrue(response.get_data().startswith(b'*{margin:0;'))
+        response.close()
+
+    def test_serve_keeps_file_wrapper(self):
+        """Test that the server's wsgi.file_wrapper survives the middleware"""
+        class ServerFileWrapper(FileWrapper):
+            pass
+
+        url = f'/assets/{self.manifest["style.css"]}'
+        environ = EnvironBuilder(url, headers={'Accept-Encoding': 'gzip'}).get_environ()
+        environ['wsgi.file_wrapper'] = ServerFileWrapper
+        started = []
+        app_iter = app.wsgi_app(environ, lambda status, headers, exc_info=None: started.append(headers))
+        self.assertIsInstance(app_iter, ServerFileWrapper)
+        self.assertIn(('Content-Encoding', 'gzip'), started[0])
+        app_iter.close()
+
+    def test_serve_missing(self):
+        """Test that unknown assets are not found"""
+        response = self.client.get('/assets/style.000000000000.css')
+        self.assertEqual(response.status_code, 404)
+
+    def test_serve_only_built_names(self):
+        """Test that the manifest and raw variants have no URL of their own"""
+        built = self.manifest['style.css']
+        for url in ('/assets/manifest.json', f'/assets/{built}.gz', f'/assets/{built}.br'):
+            for accept in ('', 'gzip, br'):
+                response = self.client.get(url, headers={'Accept-Encoding': accept})
+                self.assertEqual(response.status_code, 404, (url, accept))
+
+
+if __name__ == '__main__':
+    unittest.main()
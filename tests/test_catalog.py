@@ -0,0 +1,205 @@
+"""
+Tests for the in-memory catalog engine
+
+This module covers:
+- Loading the products table into the catalog
+- Filtering, sorting and paging against the SQLite listing query
+- Incremental refresh from the product_changes log
+- Serving the home page from the memory engine
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mall
+from mall import app
+from catalog import Catalog
+
+
+class CatalogTestCase(unittest.TestCase):
+    """Test cases for the Catalog engine"""
+
+    def setUp(self):
+        """Create a temporary database and load it into a catalog"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        mall.init_db()
+
+        self.conn = mall.get_db()
+        self.catalog = Catalog(self.db_path)
+        self.catalog.load(self.conn)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.conn.close()
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def sqlite_ids(self, **kwargs):
+        return [row['id'] for row in mall.query_products(self.conn.cursor(), **kwargs)]
+
+    def catalog_ids(self, category='all', **kwargs):
+        products, _ = self.catalog.query(category=None if category == 'all' else category,
+                                         **kwargs)
+        return [product.id for product in products]
+
+    def test_load_all_products(self):
+        """Test that every product is loaded"""
+        self.assertEqual(len(self.catalog), 15)
+        self.assertEqual(self.catalog_ids(), self.sqlite_ids())
+
+    def test_product_fields(self):
+        """Test that a catalog row exposes the same fields as sqlite3.Row"""
+        row = self.conn.execute('SELECT * FROM products WHERE id = 1').fetchone()
+        product = self.catalog.get(1)
+        for key in row.keys():
+            self.assertEqual(product[key], row[key])
+
+    def test_matches_sqlite_queries(self):
+        """Test filters and sorts against the SQLite listing query"""
+        for category in ('all', 'Electronics', 'Gaming'):
+            for search in ('', 'pro', 'Gaming'):
+                for sort in (None, 'price_asc', 'price_desc'):
+                    self.assertEqual(
+                        self.catalog_ids(category=category, search=search, sort=sort),
+                        self.sqlite_ids(category=category, search=search, sort=sort),
+                        (category, search, sort))
+
+    def test_search_wildcard_characters(self):
+        """Test that LIKE wildcards in a search are matched literally by both engines"""
+        self.conn.executemany('''
+            INSERT INTO products (name, category, price, description, image_url, stock)
+            VALUES (?, 'Home', 9.99, '', '', 1)
+        ''', [('USB_C Cable',), ('100% Cotton Towel',), ('Back\\Scratcher',)])
+        self.conn.commit()
+        self.catalog.refresh(self.conn)
+
+        for search, count in (('_', 1), ('%', 1), ('\\', 1), ('U_B', 0), ('0%C', 0)):
+            self.assertEqual(len(self.sqlite_ids(search=search)), count, search)
+            self.assertEqual(self.catalog_ids(search=search), self.sqlite_ids(search=search),
+                             search)
+
+    def test_unknown_category(self):
+        """Test that an unknown category returns no products"""
+        self.assertEqual(self.catalog.query(category='Books'), ([], 0))
+
+    def test_paging(self):
+        """Test offset and limit over a sorted listing"""
+        all_ids = self.catalog_ids(sort='price_desc')
+        products, total = self.catalog.query(sort='price_desc', offset=5, limit=4)
+        self.assertEqual(total, 15)
+        self.assertEqual([p.id for p in products], all_ids[5:9])
+
+    def test_category_names(self):
+        """Test that categories match SELECT DISTINCT"""
+        rows = self.conn.execute('SELECT DISTINCT category FROM products').fetchall()
+        self.assertEqual(self.catalog.category_names(), [row[0] for row in rows])
+
+    def test_refresh_stock_update(self):
+        """Test that a stock change is picked up by refresh"""
+        self.conn.execute('UPDATE products SET stock = 7 WHERE id = 2')
+        self.conn.commit()
+
+        self.assertEqual(self.catalog.refresh(self.conn), 1)
+        self.assertEqual(self.catalog.get(2).stock, 7)
+        self.assertEqual(self.catalog.refresh(self.conn), 0)
+
+    def test_views_are_snapshots(self):
+        """Test that returned rows do not change under a later refresh"""
+        products, _ = self.catalog.query(category='Electronics')
+        product = self.catalog.get(2)
+        self.conn.execute("UPDATE products SET stock = 7, name = 'Renamed' WHERE id = 2")
+        self.conn.execute('DELETE FROM products WHERE id = 1')
+        self.conn.commit()
+        self.catalog.refresh(self.conn)
+
+        self.assertEqual(products[0].name, 'iPhone 14 Pro')
+        self.assertEqual(products[1].stock, product.stock)
+        self.assertNotEqual(product.stock, 7)
+        self.assertEqual(self.catalog.get(2).name, 'Renamed')
+
+    def test_refresh_insert_update_delete(self):
+        """Test refresh across inserts, category moves and deletes"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO products (name, category, price, description, image_url, stock)
+            VALUES ('Novel', 'Books', 19.99, 'A good read', '📚', 10)
+        ''')
+        new_id = cursor.lastrowid
+        cursor.execute("UPDATE products SET category = 'Books', price = 5 WHERE id = 3")
+        cursor.execute("UPDATE products SET category = 'Fashion' WHERE id = 1")
+        cursor.execute('DELETE FROM products WHERE id = 4')
+        self.conn.commit()
+
+        self.catalog.refresh(self.conn)
+
+        self.assertEqual(len(self.catalog), 15)
+        self.assertIsNone(self.catalog.get(4))
+        self.assertEqual(self.catalog_ids(category='Books'), [3, new_id])
+        self.assertNotIn(3, self.catalog_ids(category='Electronics'))
+        self.assertEqual(self.catalog_ids(category='Fashion'), [1, 5, 6, 7, 8])
+        for category in ('all', 'Electronics', 'Fashion', 'Books'):
+            for sort in (None, 'price_asc', 'price_desc'):
+                self.assertEqual(self.catalog_ids(category=category, sort=sort),
+                                 self.sqlite_ids(category=category, sort=sort),
+                                 (category, sort))
+
+
+class CatalogEngineTestCase(unittest.TestCase):
+    """Test the home page served from the memory engine"""
+
+    def setUp(self):
+        """Set up test client with the memory catalog engine"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test-secret-key'
+        app.config['CATALOG_ENGINE'] = 'memory'
+
+        self.client = app.test_client()
+        mall.init_db()
+
+    def tearDown(self):
+        """Restore the SQLite engine and clean up"""
+        app.config['CATALOG_ENGINE'] = 'sqlite'
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_home_page_listing(self):
+        """Test that products and categories render from the catalog"""
+        response = self.client.get('/?category=Electronics&sort=price_asc')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'iPhone 14 Pro', response.data)
+        self.assertNotIn(b'Coffee Maker', response.data)
+        self.assertIn(b'Gaming', response.data)
+        self.assertLess(response.data.index(b'AirPods Pro'),
+                        response.data.index(b'MacBook Pro'))
+
+    def test_stock_refreshed_after_checkout(self):
+        """Test that checkout stock decrements reach the catalog"""
+        self.client.get('/')
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 3}
+        self.client.post('/checkout',
+                         data={
+                             'name': 'Catalog Test',
+                             'email': 'catalog@example.com',
+                             'address': 'Catalog Address'
+                         })
+
+        self.client.get('/')
+        self.assertEqual(mall.get_catalog().get(1).stock, 47)
+
+
+if __name__ == '__main__':
+    unittest.main()
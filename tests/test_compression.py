@@ -0,0 +1,205 @@
+"""
+Tests for the response compression middleware
+
+This module covers:
+- Accept-Encoding negotiation
+- Size threshold, content type and status checks
+- Buffered and streaming (generator) responses
+- Vary/ETag headers and the compressed body cache
+- Compression of the mall's rendered pages
+"""
+
+import unittest
+import gzip
+import os
+import sys
+import tempfile
+import zlib
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import mall
+from mall import app
+from compression import CompressionMiddleware, negotiate_encoding
+
+BODY = b'<div class="product-card">Gaming Mouse</div>\n' * 50
+
+
+def make_client(response, **kwargs):
+    """Client for a middleware-wrapped app that always returns response"""
+    def inner(environ, start_response):
+        return response(environ, start_response)
+    return Client(CompressionMiddleware(inner, **kwargs))
+
+
+class NegotiateEncodingTestCase(unittest.TestCase):
+    """Test cases for negotiate_encoding"""
+
+    def test_prefers_gzip(self):
+        """Test that gzip wins over deflate at equal quality"""
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'gzip')
+
+    def test_quality_values(self):
+        """Test that q-values are honoured"""
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, deflate'), 'deflate')
+        self.assertIsNone(negotiate_encoding('gzip;q=0, identity'))
+
+    def test_wildcard_and_missing(self):
+        """Test wildcard and empty headers"""
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+        self.assertIsNone(negotiate_encoding(''))
+
+
+class CompressionMiddlewareTestCase(unittest.TestCase):
+    """Test cases for CompressionMiddleware"""
+
+    def test_gzip_buffered(self):
+        """Test that a large HTML response is gzipped with correct headers"""
+        client = make_client(Response(BODY, mimetype='text/html'))
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        data = response.get_data()
+        self.assertEqual(int(response.headers['Content-Length']), len(data))
+        self.assertLess(len(data), len(BODY))
+        self.assertEqual(gzip.decompress(data), BODY)
+
+    def test_deflate(self):
+        """Test deflate (zlib-wrapped) output"""
+        client = make_client(Response(BODY, mimetype='text/html'))
+        response = client.get('/', headers={'Accept-Encoding': 'deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.get_data()), BODY)
+
+    def test_no_accept_encoding(self):
+        """Test that clients without compression get the body unchanged"""
+        client = make_client(Response(BODY, mimetype='text/html'))
+        response = client.get('/')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.get_data(), BODY)
+
+    def test_below_min_size(self):
+        """Test that small responses are not compressed"""
+        client = make_client(Response(b'<p>small</p>', mimetype='text/html'), min_size=500)
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_data(), b'<p>small</p>')
+
+    def test_skips_other_types_and_statuses(self):
+        """Test that binary types, errors and encoded bodies pass through"""
+        cases = [
+            Response(BODY, mimetype='image/png'),
+            Response(BODY, status=404, mimetype='text/html'),
+            Response(BODY, mimetype='text/css', headers={'Content-Encoding': 'br'}),
+            Response(BODY, mimetype='text/html', headers={'Cache-Control': 'no-transform'}),
+        ]
+        for case in cases:
+            response = make_client(case).get('/', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.get_data(), BODY)
+            self.assertNotEqual(response.headers.get('Content-Encoding'), 'gzip')
+
+    def test_head_request(self):
+        """Test that HEAD responses keep their original headers"""
+        client = make_client(Response(BODY, mimetype='text/html'))
+        response = client.head('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(int(response.headers['Content-Length']), len(BODY))
+
+    def test_existing_vary_and_etag(self):
+        """Test that Vary is extended and a strong ETag made weak"""
+        client = make_client(Response(BODY, mimetype='text/html',
+                                      headers={'Vary': 'Cookie', 'ETag': '"abc"'}))
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Vary'], 'Cookie, Accept-Encoding')
+        self.assertEqual(response.headers['ETag'], 'W/"abc"')
+
+    def test_streaming_generator(self):
+        """Test that generator responses are compressed as they stream"""
+        chunks = [BODY[i:i + 100] for i in range(0, len(BODY), 100)]
+        client = make_client(Response(iter(chunks), mimetype='text/html'), min_size=250)
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+
+        parts = list(response.response)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Each part is flushed, so it decodes on its own without the rest
+        self.assertEqual(decompressor.decompress(parts[0]), b''.join(chunks[:3]))
+        for part in parts[1:]:
+            decompressor.decompress(part)
+        self.assertEqual(gzip.decompress(b''.join(parts)), BODY)
+        response.close()
+
+    def test_streaming_below_min_size(self):
+        """Test that a short generator response is sent uncompressed"""
+        client = make_client(Response(iter([b'<p>', b'short', b'</p>']), mimetype='text/html'))
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_data(), b'<p>short</p>')
+
+    def test_compressed_body_cache(self):
+        """Test that identical bodies are compressed once"""
+        middleware = CompressionMiddleware(None, cache_size=2)
+        first = middleware.compress(BODY, 'gzip')
+        self.assertIs(middleware.compress(BODY, 'gzip'), first)
+        self.assertIsNot(middleware.compress(BODY, 'deflate'), first)
+
+        middleware.compress(b'other', 'gzip')
+        self.assertIsNot(middleware.compress(BODY, 'gzip'), first)
+
+    def test_config_overrides_arguments(self):
+        """Test that a config mapping is consulted on every call"""
+        config = {}
+        middleware = CompressionMiddleware(None, level=1, config=config)
+        fast = middleware.compress(BODY, 'gzip')
+        config['COMPRESS_LEVEL'] = 9
+        self.assertEqual(middleware.level, 9)
+        self.assertIsNot(middleware.compress(BODY, 'gzip'), fast)
+
+
+class MallCompressionTestCase(unittest.TestCase):
+    """Test compression of the mall's rendered pages"""
+
+    def setUp(self):
+        """Set up test client and database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        mall.init_db()
+
+    def tearDown(self):
+        """Clean up"""
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_home_page_gzipped(self):
+        """Test that the home page is served gzipped when accepted"""
+        plain = self.client.get('/').get_data()
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.get_data()), plain)
+
+    def test_config_read_per_request(self):
+        """Test that COMPRESS_* changes after import take effect"""
+        original = app.config['COMPRESS_MIN_SIZE']
+        try:
+            app.config['COMPRESS_MIN_SIZE'] = 10 ** 7
+            response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', response.headers)
+        finally:
+            app.config['COMPRESS_MIN_SIZE'] = original
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Tests for the synthetic data generator and scale fixtures
+
+This module covers:
+- Row counts, schema version and determinism of generated databases
+- Zipfian product popularity
+- The on-disk database cache
+- Browsing, order history and the catalog engine at scale
+"""
+
+import unittest
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+# Add parent directory to path to import mall module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datagen
+import mall
+from catalog import Catalog
+from tests.scale import ScaleTestCase
+
+
+def table_digest(path):
+    """Hash of every row in the data tables, in id order"""
+    conn = sqlite3.connect(path)
+    digest = hashlib.sha256()
+    for table in ('products', 'orders', 'order_items'):
+        for row in conn.execute(f'SELECT * FROM {table} ORDER BY id'):
+            digest.update(repr(row).encode())
+    conn.close()
+    return digest.hexdigest()
+
+
+class GenerateTestCase(unittest.TestCase):
+    """Test cases for datagen.generate"""
+
+    PARAMS = {'products': 300, 'categories': 5, 'customers': 40, 'orders': 600}
+
+    def setUp(self):
+        """Create a scratch directory"""
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        shutil.rmtree(self.work_dir)
+
+    def build(self, name, **params):
+        path = os.path.join(self.work_dir, name)
+        datagen.generate(path, **{**self.PARAMS, **params})
+        return path
+
+    def test_counts_and_schema(self):
+        """Test row counts, categories and the recorded schema version"""
+        path = self.build('a.db')
+        conn = sqlite3.connect(path)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM products').fetchone()[0], 300)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0], 600)
+        self.assertEqual(conn.execute('SELECT COUNT(DISTINCT category) FROM products').fetchone()[0], 5)
+        self.assertEqual(conn.execute('SELECT COUNT(DISTINCT customer_email) FROM orders').fetchone()[0], 40)
+        self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], mall.SCHEMA_VERSION)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn('idx_order_items_order', indexes)
+        conn.close()
+
+    def test_change_log_empty_with_triggers(self):
+        """Test that the bulk load logs no changes and leaves the triggers in place"""
+        path = self.build('a.db')
+        conn = sqlite3.connect(path)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM product_changes').fetchone()[0], 0)
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        self.assertEqual(triggers, {'products_log_insert', 'products_log_update',
+                                    'products_log_delete'})
+
+        conn.execute('UPDATE products SET stock = 1 WHERE id = 5')
+        self.assertEqual(conn.execute('SELECT product_id FROM product_changes').fetchall(), [(5,)])
+        conn.close()
+
+    def test_order_totals_match_items(self):
+        """Test that each order total is the sum of its items"""
+        path = self.build('a.db')
+        conn = sqlite3.connect(path)
+        mismatches = conn.execute('''
+            SELECT COUNT(*) FROM orders o
+            WHERE ABS(o.total_amount - (SELECT SUM(price * quantity) FROM order_items
+                                        WHERE order_id = o.id)) > 0.01
+        ''').fetchone()[0]
+        conn.close()
+        self.assertEqual(mismatches, 0)
+
+    def test_deterministic(self):
+        """Test that the same seed gives the same data and another seed does not"""
+        first = table_digest(self.build('a.db', seed=7))
+        self.assertEqual(table_digest(self.build('b.db', seed=7)), first)
+        self.assertNotEqual(table_digest(self.build('c.db', seed=8)), first)
+
+    def test_zipf_popularity(self):
+        """Test that a few products account for most order lines"""
+        path = self.build('a.db', orders=3000)
+        conn = sqlite3.connect(path)
+        counts = [row[0] for row in conn.execute('''
+            SELECT COUNT(*) AS lines FROM order_items GROUP BY product_id ORDER BY lines DESC
+        ''')]
+        conn.close()
+        self.assertGreater(sum(counts[:15]), sum(counts) / 2)
+        self.assertGreater(counts[0], 20 * counts[len(counts) // 2])
+
+    def test_refuses_existing_database(self):
+        """Test that a database with data is never overwritten"""
+        path = self.build('a.db')
+        with self.assertRaises(FileExistsError):
+            datagen.generate(path, **self.PARAMS)
+
+    def test_cached_database(self):
+        """Test that the cache builds once per parameter set"""
+        first = datagen.cached_database(cache_dir=self.work_dir, **self.PARAMS)
+        mtime = os.stat(first).st_mtime_ns
+        self.assertEqual(datagen.cached_database(cache_dir=self.work_dir, **self.PARAMS), first)
+        self.assertEqual(os.stat(first).st_mtime_ns, mtime)
+
+        other = datagen.cached_database(cache_dir=self.work_dir, **{**self.PARAMS, 'seed': 3})
+        self.assertNotEqual(other, first)
+        self.assertEqual(sorted(os.listdir(self.work_dir)),
+                         sorted([os.path.basename(first), os.path.basename(other)]))
+
+
+class ScaleAppTestCase(ScaleTestCase):
+    """Run the app against a generated database"""
+
+    def test_init_db_leaves_generated_data(self):
+        """Test that startup schema checks do not reseed"""
+        self.assertFalse(mall.init_db())
+
+    def test_home_page(self):
+        """Test browsing, filtering and sorting at scale"""
+        response = self.client.get('/?category=Books&sort=price_desc')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Books', response.data)
+
+    def test_catalog_matches_sqlite(self):
+        """Test the memory catalog against SQLite at scale"""
+        conn = mall.get_db()
+        catalog = Catalog(self.db_path)
+        catalog.load(conn)
+        for sort in (None, 'price_asc', 'price_desc'):
+            for category, search in (('all', ''), ('Gaming', ''), ('all', 'smart')):
+                expected = [row['id'] for row in
+                            mall.query_products(conn.cursor(), category, search, sort)]
+                products, total = catalog.query(None if category == 'all' else category,
+                                                search, sort)
+                self.assertEqual([p.id for p in products], expected)
+                self.assertEqual(total, len(expected))
+        conn.close()
+
+    def test_order_history_full_session(self):
+        """Test paging through a session holding the most order ids it can"""
+        conn = mall.get_db()
+        ids = [row[0] for row in conn.execute(
+            'SELECT id FROM orders ORDER BY random() LIMIT ?',
+            (mall.app.config['ORDER_HISTORY_SESSION_LIMIT'],))]
+
+        seen, before = [], None
+        while True:
+            orders, before = mall.fetch_order_history(conn.cursor(), ids, before, limit=7)
+            seen.extend(order['id'] for order in orders)
+            if before is None:
+                break
+        conn.close()
+        self.assertEqual(sorted(seen), sorted(ids))
+
+
+def test_scale_fixture(mall_scale_db):
+    """pytest: the mall_scale_db fixture gives a writable copy to the app"""
+    assert mall.DATABASE == mall_scale_db
+    conn = mall.get_db()
+    conn.execute('DELETE FROM order_items')
+    conn.commit()
+    conn.close()
+
+    source = sqlite3.connect(datagen.cached_database(**ScaleTestCase.SCALE))
+    assert source.execute('SELECT COUNT(*) FROM order_items').fetchone()[0] > 0
+    source.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
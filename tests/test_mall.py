@@ -12,6 +12,7 @@ This module contains comprehensive tests for:
 import unittest
 import os
 import sys
+import shutil
 import tempfile
 
 # Add parent directory to path to import mall module
@@ -432,6 +433,470 @@ class MallAPIIntegrationTest(unittest.TestCase):
         self.assertIn(b'Order Placed Successfully', response.data)
 
 
+class ProductChangeFeedTestCase(unittest.TestCase):
+    """Tests for the product change log and /changes feed"""
+    
+    def setUp(self):
+        """Set up test client and database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test-secret-key'
+        
+        self.client = app.test_client()
+        
+        with app.app_context():
+            mall.init_db()
+    
+    def tearDown(self):
+        """Clean up"""
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def current_seq(self):
+        return self.client.get('/changes').get_json()['seq']
+    
+    def test_seed_data_logged(self):
+        """Test that inserting the sample products fills the change log"""
+        response = self.client.get('/changes')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'seq': 15, 'changes': [], 'reset': False})
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+    
+    def test_checkout_stock_change(self):
+        """Test that the checkout stock decrement appears as a delta"""
+        since = self.current_seq()
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'2': 4}
+        self.client.post('/checkout',
+                        data={
+                            'name': 'Feed Test',
+                            'email': 'feed@example.com',
+                            'address': 'Feed Address'
+                        })
+        
+        data = self.client.get(f'/changes?since={since}&wait=0').get_json()
+        self.assertEqual(data['seq'], since + 1)
+        self.assertEqual(data['changes'], [
+            {'id': 2, 'seq': since + 1, 'deleted': False, 'price': 2499.99, 'stock': 26}
+        ])
+    
+    def test_only_latest_state_per_product(self):
+        """Test that repeated writes to one product collapse to one delta"""
+        since = self.current_seq()
+        conn = mall.get_db()
+        conn.execute('UPDATE products SET stock = 10 WHERE id = 5')
+        conn.execute('UPDATE products SET price = 99.5 WHERE id = 5')
+        conn.execute('DELETE FROM products WHERE id = 6')
+        conn.commit()
+        conn.close()
+        
+        changes = self.client.get(f'/changes?since={since}&wait=0').get_json()['changes']
+        self.assertEqual([(c['id'], c['deleted']) for c in changes], [(5, False), (6, True)])
+        self.assertEqual((changes[0]['price'], changes[0]['stock']), (99.5, 10))
+    
+    def test_no_changes_times_out(self):
+        """Test that a long-poll with nothing new returns empty"""
+        since = self.current_seq()
+        data = self.client.get(f'/changes?since={since}&wait=0').get_json()
+        self.assertEqual(data, {'seq': since, 'changes': [], 'reset': False})
+    
+    def test_unknown_cursor_resets(self):
+        """Test that a cursor ahead of the log asks the client to reload"""
+        data = self.client.get('/changes?since=1000').get_json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['seq'], 15)
+    
+    def test_compact_changes(self):
+        """Test that compaction keeps only the newest entry per product"""
+        conn = mall.get_db()
+        for stock in (1, 2, 3):
+            conn.execute('UPDATE products SET stock = ? WHERE id = 1', (stock,))
+        conn.commit()
+        
+        self.assertEqual(mall.compact_changes(conn), 3)
+        rows = conn.execute('SELECT seq FROM product_changes WHERE product_id = 1').fetchall()
+        self.assertEqual([row['seq'] for row in rows], [18])
+        self.assertEqual(mall.latest_change_seq(conn.cursor()), 18)
+        conn.close()
+        
+        changes = self.client.get('/changes?since=10&wait=0').get_json()['changes']
+        self.assertEqual([c['id'] for c in changes], [11, 12, 13, 14, 15, 1])
+
+
+class StartupTestCase(unittest.TestCase):
+    """Tests for schema versioning and startup warm-up"""
+    
+    def setUp(self):
+        """Set up an empty database and template cache directory"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.cache_dir = tempfile.mkdtemp()
+        
+        self.original_database = mall.DATABASE
+        self.original_cache_dir = app.config['TEMPLATE_CACHE_DIR']
+        mall.DATABASE = self.db_path
+        app.config['TEMPLATE_CACHE_DIR'] = self.cache_dir
+        app.config['TESTING'] = True
+    
+    def tearDown(self):
+        """Clean up"""
+        app.jinja_env.bytecode_cache = None
+        app.jinja_env.cache.clear()
+        app.config['TEMPLATE_CACHE_DIR'] = self.original_cache_dir
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        shutil.rmtree(self.cache_dir)
+    
+    def test_init_db_sets_schema_version(self):
+        """Test that init_db records the schema version"""
+        self.assertTrue(mall.init_db())
+        conn = mall.get_db()
+        self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0],
+                         mall.SCHEMA_VERSION)
+        conn.close()
+    
+    def test_init_db_skips_current_schema(self):
+        """Test that a second init_db does no schema work"""
+        mall.init_db()
+        conn = mall.get_db()
+        conn.execute('DELETE FROM products')
+        conn.commit()
+        conn.close()
+        
+        self.assertFalse(mall.init_db())
+        conn = mall.get_db()
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM products').fetchone()[0], 0)
+        conn.close()
+    
+    def test_init_db_upgrades_old_version(self):
+        """Test that an older schema version is brought up to date"""
+        mall.init_db()
+        conn = mall.get_db()
+        conn.execute('PRAGMA user_version = 3')
+        conn.execute('DROP TABLE product_changes')
+        conn.execute('CREATE INDEX idx_orders_customer ON orders (customer_email, order_date, id)')
+        conn.commit()
+        conn.close()
+        
+        self.assertTrue(mall.init_db())
+        conn = mall.get_db()
+        conn.execute('SELECT * FROM product_changes')
+        indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertNotIn('idx_orders_customer', indexes)
+        conn.close()
+    
+    def test_precompile_templates(self):
+        """Test that every template lands in the bytecode cache"""
+        count = mall.precompile_templates()
+        self.assertEqual(count, len(os.listdir(os.path.join(app.root_path, 'templates'))))
+        self.assertEqual(len(os.listdir(self.cache_dir)), count)
+    
+    def test_startup_breakdown(self):
+        """Test that startup reports each phase and leaves the app ready"""
+        timings = mall.startup()
+        self.assertEqual(set(timings), {'schema', 'templates', 'catalog', 'total'})
+        self.assertAlmostEqual(timings['total'],
+                               timings['schema'] + timings['templates'] + timings['catalog'])
+        
+        response = app.test_client().get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'iPhone 14 Pro', response.data)
+
+
+class OrderHistoryTestCase(unittest.TestCase):
+    """Tests for the customer order history"""
+    
+    def setUp(self):
+        """Set up test client and database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test-secret-key'
+        
+        self.client = app.test_client()
+        
+        with app.app_context():
+            mall.init_db()
+    
+    def tearDown(self):
+        """Clean up"""
+        app.config['ORDER_HISTORY_PAGE_SIZE'] = 20
+        app.config['ORDER_HISTORY_SESSION_LIMIT'] = 100
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def add_orders(self, email, count, order_date='2025-01-01 10:00:00'):
+        """Insert count orders with two items each, all at order_date"""
+        conn = mall.get_db()
+        cursor = conn.cursor()
+        ids = []
+        for _ in range(count):
+            cursor.execute('''
+                INSERT INTO orders (customer_name, customer_email, customer_address,
+                                    total_amount, order_date)
+                VALUES ('History Test', ?, 'History Address', 100, ?)
+            ''', (email, order_date))
+            ids.append(cursor.lastrowid)
+            cursor.executemany('''
+                INSERT INTO order_items (order_id, product_id, product_name, quantity, price)
+                VALUES (?, ?, ?, 1, 50)
+            ''', [(cursor.lastrowid, 1, 'iPhone 14 Pro'), (cursor.lastrowid, 2, 'MacBook Pro 16"')])
+        conn.commit()
+        conn.close()
+        return ids
+    
+    def test_history_requires_customer(self):
+        """Test that the history page needs a checkout in this session"""
+        response = self.client.get('/orders', follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'No orders yet', response.data)
+    
+    def test_history_after_checkout(self):
+        """Test that a placed order shows up in the history"""
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'3': 2}
+        self.client.post('/checkout',
+                        data={
+                            'name': 'History Test',
+                            'email': 'history@example.com',
+                            'address': 'History Address'
+                        })
+        
+        response = self.client.get('/orders')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'My Orders', response.data)
+        self.assertIn(b'AirPods Pro', response.data)
+    
+    def test_history_ignores_checkout_email(self):
+        """Test that checking out with someone's email does not reveal their orders"""
+        victim = self.add_orders('victim@example.com', 2)
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'3': 1}
+        self.client.post('/checkout',
+                        data={
+                            'name': 'Someone Else',
+                            'email': 'victim@example.com',
+                            'address': 'Other Address'
+                        })
+        with self.client.session_transaction() as sess:
+            own = sess['order_ids']
+        
+        response = self.client.get('/orders')
+        self.assertEqual(len(own), 1)
+        self.assertIn(f'Order #{own[0]}'.encode(), response.data)
+        for order_id in victim:
+            self.assertNotIn(f'Order #{order_id}'.encode(), response.data)
+    
+    def test_session_remembers_recent_orders(self):
+        """Test that the session keeps only the most recent order ids"""
+        app.config['ORDER_HISTORY_SESSION_LIMIT'] = 2
+        for _ in range(3):
+            with self.client.session_transaction() as sess:
+                sess['cart'] = {'3': 1}
+            self.client.post('/checkout',
+                            data={
+                                'name': 'History Test',
+                                'email': 'history@example.com',
+                                'address': 'History Address'
+                            })
+        with self.client.session_transaction() as sess:
+            self.assertEqual(len(sess['order_ids']), 2)
+    
+    def test_fetch_pages_with_items(self):
+        """Test keyset pages are newest first, complete and non-overlapping"""
+        older = self.add_orders('pages@example.com', 3, '2025-01-01 10:00:00')
+        newer = self.add_orders('pages@example.com', 3, '2025-02-01 10:00:00')
+        self.add_orders('pages@example.com', 2)
+        
+        conn = mall.get_db()
+        cursor = conn.cursor()
+        seen = []
+        before = None
+        while True:
+            orders, before = mall.fetch_order_history(cursor, older + newer, before, limit=4)
+            for order in orders:
+                self.assertEqual([item['product_id'] for item in order['items']], [1, 2])
+            seen.extend(order['id'] for order in orders)
+            if before is None:
+                break
+        conn.close()
+        
+        self.assertEqual(seen, newer[::-1] + older[::-1])
+    
+    def test_fetch_by_order_ids(self):
+        """Test that order_ids limits the history to those orders"""
+        first = self.add_orders('a@example.com', 2)
+        second = self.add_orders('b@example.com', 2, '2025-02-01 10:00:00')
+        
+        conn = mall.get_db()
+        orders, before = mall.fetch_order_history(conn.cursor(), [first[1], second[0]])
+        conn.close()
+        self.assertEqual([order['id'] for order in orders], [second[0], first[1]])
+        self.assertIsNone(before)
+    
+    def test_history_query_plan(self):
+        """Test that a history page reads only the session's orders and their items"""
+        # Sorting the page still uses a temporary b-tree, over at most
+        # ORDER_HISTORY_SESSION_LIMIT rows
+        ids = self.add_orders('plan@example.com', 3)
+        conn = mall.get_db()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        mall.fetch_order_history(conn.cursor(), ids, ('2025-01-01 10:00:00', ids[2]), limit=2)
+        conn.set_trace_callback(None)
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statements[-1])]
+        conn.close()
+        
+        self.assertIn('SEARCH orders USING INTEGER PRIMARY KEY (rowid=?)', plan)
+        self.assertIn('SEARCH i USING INDEX idx_order_items_order (order_id=?) LEFT-JOIN', plan)
+        self.assertEqual([step for step in plan if step.startswith('SCAN')], ['SCAN page'])
+    
+    def test_history_next_page_link(self):
+        """Test paging through the history page"""
+        app.config['ORDER_HISTORY_PAGE_SIZE'] = 2
+        ids = self.add_orders('paging@example.com', 3)
+        self.add_orders('paging@example.com', 1)
+        with self.client.session_transaction() as sess:
+            sess['order_ids'] = ids
+        
+        response = self.client.get('/orders')
+        self.assertIn(f'Order #{ids[2]}'.encode(), response.data)
+        self.assertIn(b'Older Orders', response.data)
+        
+        response = self.client.get('/orders', query_string={'before': f'2025-01-01 10:00:00|{ids[1]}'})
+        self.assertIn(f'Order #{ids[0]}'.encode(), response.data)
+        self.assertNotIn(f'Order #{ids[1]}'.encode(), response.data)
+        self.assertNotIn(b'Older Orders', response.data)
+
+
+class IdempotentCheckoutTestCase(unittest.TestCase):
+    """Tests for checkout de-duplication with idempotency keys"""
+    
+    def setUp(self):
+        """Set up test client and database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        
+        self.original_database = mall.DATABASE
+        mall.DATABASE = self.db_path
+        
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test-secret-key'
+        
+        self.client = app.test_client()
+        
+        with app.app_context():
+            mall.init_db()
+    
+    def tearDown(self):
+        """Clean up"""
+        mall._idempotency_cache.clear()
+        mall.DATABASE = self.original_database
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def submit(self, key):
+        return self.client.post('/checkout',
+                                data={
+                                    'name': 'Retry Test',
+                                    'email': 'retry@example.com',
+                                    'address': 'Retry Address',
+                                    'idempotency_key': key
+                                })
+    
+    def count(self, sql):
+        conn = mall.get_db()
+        value = conn.execute(sql).fetchone()[0]
+        conn.close()
+        return value
+    
+    def test_checkout_form_has_key(self):
+        """Test that the checkout form carries a fresh idempotency key"""
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 1}
+        first = self.client.get('/checkout').data
+        second = self.client.get('/checkout').data
+        self.assertIn(b'name="idempotency_key"', first)
+        key = first.split(b'name="idempotency_key" value="')[1].split(b'"')[0]
+        self.assertGreaterEqual(len(key), 32)
+        self.assertNotIn(key, second)
+    
+    def test_duplicate_submission(self):
+        """Test that a replayed submission writes nothing and returns the same order"""
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 2}
+        first = self.submit('key-duplicate')
+        
+        # Double click: the second request still carries the full cart
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 2}
+        second = self.submit('key-duplicate')
+        # Retry after the cart was cleared
+        third = self.submit('key-duplicate')
+        
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second.location, first.location)
+        self.assertEqual(third.location, first.location)
+        self.assertEqual(self.count('SELECT COUNT(*) FROM orders'), 1)
+        self.assertEqual(self.count('SELECT COUNT(*) FROM order_items'), 1)
+        self.assertEqual(self.count('SELECT stock FROM products WHERE id = 1'), 48)
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['cart'], {})
+            self.assertEqual(len(sess['order_ids']), 1)
+    
+    def test_duplicate_found_in_table(self):
+        """Test that keys survive losing the in-memory cache"""
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'3': 1}
+        first = self.submit('key-restart')
+        mall._idempotency_cache.clear()
+        
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'3': 1}
+        second = self.submit('key-restart')
+        self.assertEqual(second.location, first.location)
+        self.assertEqual(self.count('SELECT COUNT(*) FROM orders'), 1)
+    
+    def test_distinct_keys_place_distinct_orders(self):
+        """Test that different submissions are not merged"""
+        for key in ('key-a', 'key-b'):
+            with self.client.session_transaction() as sess:
+                sess['cart'] = {'1': 1}
+            self.submit(key)
+        self.assertEqual(self.count('SELECT COUNT(*) FROM orders'), 2)
+        self.assertEqual(self.count('SELECT COUNT(*) FROM idempotency_keys'), 2)
+    
+    def test_expired_key(self):
+        """Test that a key past its TTL no longer de-duplicates and is purged"""
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 1}
+        self.submit('key-expired')
+        mall._idempotency_cache.clear()
+        conn = mall.get_db()
+        conn.execute('UPDATE idempotency_keys SET created_at = created_at - ?',
+                     (app.config['IDEMPOTENCY_TTL'] + 1,))
+        conn.commit()
+        conn.close()
+        
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 1}
+        self.submit('key-other')
+        self.assertEqual(self.count("SELECT COUNT(*) FROM idempotency_keys WHERE key = 'key-expired'"), 0)
+        
+        with self.client.session_transaction() as sess:
+            sess['cart'] = {'1': 1}
+        self.submit('key-expired')
+        self.assertEqual(self.count('SELECT COUNT(*) FROM orders'), 3)
+
+
 def run_tests():
     """Run all tests and display results"""
     # Create test suite
@@ -441,6 +906,10 @@ def run_tests():
     # Add all test cases
     suite.addTests(loader.loadTestsFromTestCase(MallTestCase))
     suite.addTests(loader.loadTestsFromTestCase(MallAPIIntegrationTest))
+    suite.addTests(loader.loadTestsFromTestCase(ProductChangeFeedTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(StartupTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(OrderHistoryTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(IdempotentCheckoutTestCase))
     
     # Run tests with verbose output
     runner = unittest.TextTestRunner(verbosity=2)